@@ -1,17 +1,25 @@
-import os, getpass, time
+import os, getpass, time, asyncio, hashlib, glob, multiprocessing
 from uuid import uuid4
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from operator import itemgetter
 import pandas as pd
+import httpx
+import pyarrow as pa
+import tiktoken
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Qdrant
-from langchain.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, QueryRequest, VectorParams
+)
 
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.testset.graph import KnowledgeGraph, Node, NodeType
-from ragas.testset import TestsetGenerator
+from ragas.testset import Testset, TestsetGenerator
 from ragas.testset.synthesizers import SingleHopSpecificQuerySynthesizer, MultiHopAbstractQuerySynthesizer, MultiHopSpecificQuerySynthesizer
 from ragas.testset.transforms import default_transforms, apply_transforms
 
@@ -22,52 +30,90 @@ os.environ["LANGCHAIN_API_KEY"] = getpass.getpass("LangChain API Key:")
 os.environ["OPENAI_API_KEY"] = getpass.getpass("OpenAI API Key:")
 os.environ["LANGCHAIN_PROJECT"] = f"Philippines AI Bills RAG - {uuid4().hex[0:8]}"
 
+# Shared keep-alive HTTP/2 pools reused by every OpenAI call in this script
+http_limits = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+http_client = httpx.Client(http2=True, limits=http_limits)
+http_async_client = httpx.AsyncClient(http2=True, limits=http_limits)
+openai_http = {"http_client": http_client, "http_async_client": http_async_client}
+
 # ------------------------
 # 1. Load documents
 # ------------------------
-from langchain_community.document_loaders import DirectoryLoader, PyMuPDFLoader
+from langchain_community.document_loaders import PyMuPDFLoader
+
+def _load_one(file_path):
+    return PyMuPDFLoader(file_path).load()
+
+def load_pdfs(path):
+    # Parse PDFs in parallel, one file per task, keeping a stable file order
+    files = sorted(glob.glob(os.path.join(path, "*.pdf")))
+    # Fork-started workers don't re-run this script; use threads where fork isn't available
+    if "fork" in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("fork"))
+    else:
+        executor = ThreadPoolExecutor()
+    with executor:
+        return [doc for file_docs in executor.map(_load_one, files) for doc in file_docs]
 
 path = "bills/"
-loader = DirectoryLoader(path, glob="*.pdf", loader_cls=PyMuPDFLoader)
-docs = loader.load()
+docs = load_pdfs(path)
 
 # ------------------------
 # 2. Knowledge Graph
 # ------------------------
-generator_llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4.1-nano"))
-generator_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small"))
+generator_llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4.1-nano", **openai_http))
+generator_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small", **openai_http))
 
-kg = KnowledgeGraph()
-for doc in docs[:20]:
-    kg.nodes.append(
-        Node(
-            type=NodeType.DOCUMENT,
-            properties={"page_content": doc.page_content, "document_metadata": doc.metadata}
+# Cache files are keyed on the corpus content so a changed corpus rebuilds them
+corpus_hash = hashlib.sha256("".join(doc.page_content for doc in docs).encode("utf-8")).hexdigest()[:12]
+kg_path = f"bills/ai_law_{corpus_hash}.json"
+golden_path = f"bills/golden_{corpus_hash}.jsonl"
+
+if not os.path.exists(kg_path):
+    kg = KnowledgeGraph()
+    for doc in docs[:20]:
+        kg.nodes.append(
+            Node(
+                type=NodeType.DOCUMENT,
+                properties={"page_content": doc.page_content, "document_metadata": doc.metadata}
+            )
         )
-    )
 
-default_transforms_obj = default_transforms(documents=docs, llm=generator_llm, embedding_model=generator_embeddings)
-apply_transforms(kg, default_transforms_obj)
-kg.save("bills/ai_law.json")
-bills_data_kg = KnowledgeGraph.load("bills/ai_law.json")
+    default_transforms_obj = default_transforms(documents=docs, llm=generator_llm, embedding_model=generator_embeddings)
+    apply_transforms(kg, default_transforms_obj)
+    kg.save(kg_path)
+bills_data_kg = KnowledgeGraph.load(kg_path)
 
 # ------------------------
 # 3. Golden dataset (generate once)
 # ------------------------
-generator = TestsetGenerator(llm=generator_llm, embedding_model=generator_embeddings, knowledge_graph=bills_data_kg)
-query_distribution = [
-    (SingleHopSpecificQuerySynthesizer(llm=generator_llm), 0.5),
-    (MultiHopAbstractQuerySynthesizer(llm=generator_llm), 0.25),
-    (MultiHopSpecificQuerySynthesizer(llm=generator_llm), 0.25),
-]
-golden_dataset = generator.generate(testset_size=20, query_distribution=query_distribution)
+if os.path.exists(golden_path):
+    golden_dataset = Testset.from_jsonl(golden_path)
+else:
+    generator = TestsetGenerator(llm=generator_llm, embedding_model=generator_embeddings, knowledge_graph=bills_data_kg)
+    query_distribution = [
+        (SingleHopSpecificQuerySynthesizer(llm=generator_llm), 0.5),
+        (MultiHopAbstractQuerySynthesizer(llm=generator_llm), 0.25),
+        (MultiHopSpecificQuerySynthesizer(llm=generator_llm), 0.25),
+    ]
+    golden_dataset = generator.generate(testset_size=20, query_distribution=query_distribution)
+    golden_dataset.to_jsonl(golden_path)
+golden_rows = list(golden_dataset.to_pandas().itertuples(index=False))  # convert once, reuse everywhere
 
 # ------------------------
 # 4. Semantic chunking
 # ------------------------
+def to_chunk_table(chunks):
+    # Columnar store: one Arrow array per field instead of thousands of Document objects
+    return pa.table({
+        "text": pa.array([c.page_content for c in chunks], type=pa.string()),
+        "source": pa.array([c.metadata.get("source") for c in chunks], type=pa.string()),
+        "page": pa.array([c.metadata.get("page") for c in chunks], type=pa.int32()),
+    })
+
 def chunk_docs(docs, chunk_size=500, chunk_overlap=50):
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    return text_splitter.split_documents(docs)
+    return to_chunk_table(text_splitter.split_documents(docs))
 
 rag_documents = chunk_docs(docs[:20], chunk_size=500)  # Semantic Chunking ON
 rag_documents_no_chunk = docs[:20]  # Semantic Chunking OFF
@@ -75,11 +121,34 @@ rag_documents_no_chunk = docs[:20]  # Semantic Chunking OFF
 # ------------------------
 # 5. Vectorstore & retrievers
 # ------------------------
-def build_vectorstore(documents, embedding_model):
-    return Qdrant.from_documents(documents=documents, embedding=embedding_model,
-                                 location=":memory:", collection_name=f"AI_Bills_RAG_{uuid4().hex[:8]}")
+def embed_texts(texts, embedding_model, batch_size=256, max_workers=8):
+    # One embed_documents call per shard of 256 texts, shards sent concurrently
+    shards = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [vec for shard in executor.map(embedding_model.embed_documents, shards) for vec in shard]
+
+def build_vectorstore(chunk_table, embedding_model):
+    collection_name = f"AI_Bills_RAG_{uuid4().hex[:8]}"
+    texts = chunk_table["text"].to_pylist()
+    vectors = embed_texts(texts, embedding_model)
+
+    # Push the precomputed vectors directly instead of re-embedding through Qdrant.from_documents
+    qdrant_client = QdrantClient(location=":memory:")
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=len(vectors[0]), distance=Distance.COSINE, on_disk=False),
+    )
+    qdrant_client.upload_collection(
+        collection_name=collection_name,
+        vectors=vectors,
+        payload=[
+            {"page_content": text, "metadata": {"source": source, "page": page}}
+            for text, source, page in zip(texts, chunk_table["source"].to_pylist(), chunk_table["page"].to_pylist())
+        ],
+    )
+    return Qdrant(client=qdrant_client, collection_name=collection_name, embeddings=embedding_model)
 
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+embedding_model = OpenAIEmbeddings(model="text-embedding-3-small", **openai_http)
 
 # Base retriever (Naive)
 vectorstore_naive = build_vectorstore(rag_documents, embedding_model)
@@ -114,21 +183,51 @@ Context: {context}
 Question: {question}
 """
 
-rag_prompt = ChatPromptTemplate.from_template(RAG_PROMPT)
-empathy_rag_prompt = ChatPromptTemplate.from_template(EMPATHY_RAG_PROMPT)
+llm = ChatOpenAI(model="gpt-4.1-mini", **openai_http)
+
+MAX_CONCURRENCY = 32  # in-flight OpenAI requests per batch
+
+CONTEXT_TOKEN_BUDGET = 3000  # cap on context tokens sent to the LLM per question
+context_encoding = tiktoken.encoding_for_model("gpt-4.1-mini")
 
-llm = ChatOpenAI(model="gpt-4.1-mini")
-from langchain_core.output_parsers import StrOutputParser
+def build_context(texts, budget=CONTEXT_TOKEN_BUDGET):
+    # Keep retrieved chunks in rank order until the token budget is spent
+    kept, used = [], 0
+    for text in texts:
+        used += len(context_encoding.encode(text))
+        if kept and used > budget:
+            break
+        kept.append(text)
+    return "\n\n".join(kept)
 
-def run_rag_chain(question, retriever, prompt_template):
-    docs = retriever.get_relevant_documents(question)
-    context_text = "\n\n".join([d.page_content for d in docs])
-    
-    # prompt_text = prompt_template.format(context=context_text, question=question)
-    # return llm(prompt_text)
+context_cache = {}  # (id(retriever), chunking_status, question) -> context_text
+
+async def retrieve_contexts(questions, retriever, cache_key, q2vec):
+    missing = [q for q in questions if (*cache_key, q) not in context_cache]
+    if missing:
+        # Bypass the LangChain retriever: reuse the precomputed query vectors in one query_batch_points round-trip
+        vectorstore = retriever.vectorstore
+        query_vectors = [q2vec[q] for q in missing]
+        responses = await asyncio.to_thread(
+            vectorstore.client.query_batch_points,
+            collection_name=vectorstore.collection_name,
+            requests=[
+                QueryRequest(query=vector, limit=retriever.search_kwargs["k"], with_payload=True)
+                for vector in query_vectors
+            ],
+        )
+        for question, response in zip(missing, responses):
+            context_cache[(*cache_key, question)] = build_context(p.payload["page_content"] for p in response.points)
+    return [context_cache[(*cache_key, q)] for q in questions]
 
-    chain = prompt_template | llm | StrOutputParser()
-    return chain.invoke({"context": context_text, "question": question})
+def make_msgs(prompt, context, question):
+    # Fill the fixed template directly; no ChatPromptTemplate/parser Runnables in the hot path
+    return [HumanMessage(content=prompt.format(context=context, question=question))]
+
+async def run_rag_chain(questions, context_texts, prompt):
+    messages = [make_msgs(prompt, context_text, question) for question, context_text in zip(questions, context_texts)]
+    responses = await llm.abatch(messages, config={"max_concurrency": MAX_CONCURRENCY})
+    return [response.content for response in responses]
 
 # ------------------------
 # 7. Langsmith setup
@@ -136,31 +235,48 @@ def run_rag_chain(question, retriever, prompt_template):
 client = Client()
 langsmith_dataset = client.create_dataset(dataset_name="Philippines AI Bills v1.23", description="Golden dataset")
 
-for row in golden_dataset.to_pandas().iterrows():
-    client.create_example(
-        inputs={"question": row[1]["user_input"]},
-        outputs={"answer": row[1]["reference"]},
-        metadata={"context": row[1]["reference_contexts"]},
-        dataset_id=langsmith_dataset.id
-    )
+# One bulk request instead of one POST per golden row
+client.create_examples(
+    inputs=[{"question": row.user_input} for row in golden_rows],
+    outputs=[{"answer": row.reference} for row in golden_rows],
+    metadata=[{"context": row.reference_contexts} for row in golden_rows],
+    dataset_id=langsmith_dataset.id
+)
 
 # ------------------------
 # 8. Evaluate retrievers on golden dataset
 # ------------------------
-results = []
-
-for retriever_name, retriever_obj in retrievers.items():
-    for chunking_status, docs_set in [("Chunking ON", rag_documents), ("Chunking OFF", rag_documents_no_chunk)]:
-        for idx, row in golden_dataset.to_pandas().iterrows():
-            answer = run_rag_chain(row["user_input"], retriever_obj, rag_prompt)
-            empathy_answer = run_rag_chain(row["user_input"], retriever_obj, empathy_rag_prompt)
-            results.append({
-                "Retriever": retriever_name,
-                "Semantic Chunking": chunking_status,
-                "Question": row["user_input"],
-                "Answer": answer,
-                "Empathy Answer": empathy_answer
-            })
+async def main():
+    questions = [row.user_input for row in golden_rows]
+    results = []
+    # Embed each unique question once; every retriever variant searches with the same vectors
+    unique_qs = list(dict.fromkeys(questions))
+    q2vec = dict(zip(unique_qs, await embedding_model.aembed_documents(unique_qs)))
+    # Placeholder names alias the same retriever object; answer each unique one only once
+    answer_cache = {}  # (id(retriever), chunking_status) -> (answers, empathy_answers)
+
+    for retriever_name, retriever_obj in retrievers.items():
+        for chunking_status, docs_set in [("Chunking ON", rag_documents), ("Chunking OFF", rag_documents_no_chunk)]:
+            cache_key = (id(retriever_obj), chunking_status)
+            if cache_key not in answer_cache:
+                # Retrieve once per question; both prompts reuse the same contexts
+                context_texts = await retrieve_contexts(questions, retriever_obj, cache_key, q2vec)
+                answer_cache[cache_key] = await asyncio.gather(
+                    run_rag_chain(questions, context_texts, RAG_PROMPT),
+                    run_rag_chain(questions, context_texts, EMPATHY_RAG_PROMPT),
+                )
+            answers, empathy_answers = answer_cache[cache_key]
+            for question, answer, empathy_answer in zip(questions, answers, empathy_answers):
+                results.append({
+                    "Retriever": retriever_name,
+                    "Semantic Chunking": chunking_status,
+                    "Question": question,
+                    "Answer": answer,
+                    "Empathy Answer": empathy_answer
+                })
+    return results
+
+results = asyncio.run(main())
 
 results_df = pd.DataFrame(results)
 results_df.to_csv("retriever_comparison.csv", index=False)
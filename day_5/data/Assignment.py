@@ -1,22 +1,43 @@
 # ==============================
 # Setup
 # ==============================
-import os, getpass, time
+import os, getpass, time, hashlib, glob, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from uuid import uuid4
 import pandas as pd
+import httpx
 
 os.environ["LANGCHAIN_TRACING_V2"] = "true"
 os.environ["LANGCHAIN_API_KEY"] = getpass.getpass("LangChain API Key:")
 os.environ["OPENAI_API_KEY"] = getpass.getpass("OpenAI API Key:")
 os.environ["LANGCHAIN_PROJECT"] = f"Philippines AI Bills RAG - {uuid4().hex[0:8]}"
 
+# Shared keep-alive HTTP/2 pools reused by every OpenAI call in this script
+http_limits = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+http_client = httpx.Client(http2=True, limits=http_limits)
+http_async_client = httpx.AsyncClient(http2=True, limits=http_limits)
+openai_http = {"http_client": http_client, "http_async_client": http_async_client}
+
 # ==============================
 # Load Documents
 # ==============================
-from langchain_community.document_loaders import DirectoryLoader, PyMuPDFLoader
+from langchain_community.document_loaders import PyMuPDFLoader
+
+def _load_one(file_path):
+    return PyMuPDFLoader(file_path).load()
+
+def load_pdfs(path):
+    # Parse PDFs in parallel, one file per task, keeping a stable file order
+    files = sorted(glob.glob(os.path.join(path, "*.pdf")))
+    # Fork-started workers don't re-run this script; use threads where fork isn't available
+    if "fork" in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("fork"))
+    else:
+        executor = ThreadPoolExecutor()
+    with executor:
+        return [doc for file_docs in executor.map(_load_one, files) for doc in file_docs]
 
-loader = DirectoryLoader("bills/", glob="*.pdf", loader_cls=PyMuPDFLoader)
-docs = loader.load()[:20]  # subset for cost control
+docs = load_pdfs("bills/")[:20]  # subset for cost control
 
 # ==============================
 # LLM and Embeddings
@@ -25,45 +46,55 @@ from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
-llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4.1-mini"))
-embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small"))
+llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4.1-mini", **openai_http))
+embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small", **openai_http))
 
 # ==============================
 # Knowledge Graph
 # ==============================
 from ragas.testset.graph import KnowledgeGraph, Node, NodeType
 
-kg = KnowledgeGraph()
-for doc in docs:
-    kg.nodes.append(Node(type=NodeType.DOCUMENT,
-                         properties={"page_content": doc.page_content,
-                                     "document_metadata": doc.metadata}))
-
 from ragas.testset.transforms import default_transforms, apply_transforms
-apply_transforms(kg, default_transforms(documents=docs, llm=llm, embedding_model=embeddings))
 
-kg.save("bills/ai_law.json")
-kg = KnowledgeGraph.load("bills/ai_law.json")
+# Cache files are keyed on the corpus content so a changed corpus rebuilds them
+corpus_hash = hashlib.sha256("".join(doc.page_content for doc in docs).encode("utf-8")).hexdigest()[:12]
+kg_path = f"bills/ai_law_{corpus_hash}.json"
+golden_path = f"bills/golden_dataset_{corpus_hash}.jsonl"
+
+if not os.path.exists(kg_path):
+    kg = KnowledgeGraph()
+    for doc in docs:
+        kg.nodes.append(Node(type=NodeType.DOCUMENT,
+                             properties={"page_content": doc.page_content,
+                                         "document_metadata": doc.metadata}))
+
+    apply_transforms(kg, default_transforms(documents=docs, llm=llm, embedding_model=embeddings))
+    kg.save(kg_path)
+kg = KnowledgeGraph.load(kg_path)
 
 # ==============================
 # Golden Dataset (Synthetic)
 # ==============================
-from ragas.testset import TestsetGenerator
+from ragas.testset import Testset, TestsetGenerator
 from ragas.testset.synthesizers import (
     SingleHopSpecificQuerySynthesizer,
     MultiHopAbstractQuerySynthesizer,
     MultiHopSpecificQuerySynthesizer
 )
 
-generator = TestsetGenerator(llm=llm, embedding_model=embeddings, knowledge_graph=kg)
-query_distribution = [
-    (SingleHopSpecificQuerySynthesizer(llm=llm), 0.5),
-    (MultiHopAbstractQuerySynthesizer(llm=llm), 0.25),
-    (MultiHopSpecificQuerySynthesizer(llm=llm), 0.25),
-]
+if os.path.exists(golden_path):
+    golden_dataset = Testset.from_jsonl(golden_path)
+else:
+    generator = TestsetGenerator(llm=llm, embedding_model=embeddings, knowledge_graph=kg)
+    query_distribution = [
+        (SingleHopSpecificQuerySynthesizer(llm=llm), 0.5),
+        (MultiHopAbstractQuerySynthesizer(llm=llm), 0.25),
+        (MultiHopSpecificQuerySynthesizer(llm=llm), 0.25),
+    ]
 
-golden_dataset = generator.generate(testset_size=20, query_distribution=query_distribution)
-golden_dataset.to_jsonl("bills/golden_dataset.json")  # Save for reuse
+    golden_dataset = generator.generate(testset_size=20, query_distribution=query_distribution)
+    golden_dataset.to_jsonl(golden_path)  # Save for reuse
+golden_rows = list(golden_dataset.to_pandas().itertuples(index=False))  # convert once, reuse everywhere
 
 # ==============================
 # LangSmith Dataset
@@ -73,13 +104,13 @@ client = Client()
 dataset_name = "Philippines AI Bills - Golden Dataset 3"
 ls_dataset = client.create_dataset(dataset_name=dataset_name,
                                    description="Golden dataset for retriever benchmarking")
-for row in golden_dataset.to_pandas().itertuples():
-    client.create_example(
-        inputs={"question": row.user_input},
-        outputs={"answer": row.reference},
-        metadata={"context": row.reference_contexts},
-        dataset_id=ls_dataset.id
-    )
+# One bulk request instead of one POST per golden row
+client.create_examples(
+    inputs=[{"question": row.user_input} for row in golden_rows],
+    outputs=[{"answer": row.reference} for row in golden_rows],
+    metadata=[{"context": row.reference_contexts} for row in golden_rows],
+    dataset_id=ls_dataset.id
+)
 
 # ==============================
 # Retriever Setup
@@ -87,22 +118,101 @@ for row in golden_dataset.to_pandas().itertuples():
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Qdrant
 from langchain_openai import OpenAIEmbeddings
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, QueryRequest, VectorParams
+)
 from operator import itemgetter
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableParallel
 from langchain.schema import StrOutputParser
+import pyarrow as pa
+import tiktoken
+
+# One embedding client shared by every vectorstore below
+embedding_model = OpenAIEmbeddings(model="text-embedding-3-small", **openai_http)
+
+def embed_texts(texts, batch_size=256, max_workers=8):
+    # One embed_documents call per shard of 256 texts, shards sent concurrently
+    shards = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [vec for shard in executor.map(embedding_model.embed_documents, shards) for vec in shard]
+
+def to_chunk_table(chunks):
+    # Columnar store: one Arrow array per field instead of thousands of Document objects
+    return pa.table({
+        "text": pa.array([c.page_content for c in chunks], type=pa.string()),
+        "source": pa.array([c.metadata.get("source") for c in chunks], type=pa.string()),
+        "page": pa.array([c.metadata.get("page") for c in chunks], type=pa.int32()),
+    })
+
+def build_vectorstore(chunk_table, collection_name):
+    texts = chunk_table["text"].to_pylist()
+    vectors = embed_texts(texts)
+
+    # Push the precomputed vectors directly instead of re-embedding through Qdrant.from_documents
+    qdrant_client = QdrantClient(location=":memory:")
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=len(vectors[0]), distance=Distance.COSINE, on_disk=False),
+    )
+    qdrant_client.upload_collection(
+        collection_name=collection_name,
+        vectors=vectors,
+        payload=[
+            {"page_content": text, "metadata": {"source": source, "page": page}}
+            for text, source, page in zip(texts, chunk_table["source"].to_pylist(), chunk_table["page"].to_pylist())
+        ],
+    )
+    return Qdrant(client=qdrant_client, collection_name=collection_name, embeddings=embedding_model)
 
-# Split docs for vector retrieval
+CONTEXT_TOKEN_BUDGET = 3000  # cap on context tokens sent to the LLM per question
+context_encoding = tiktoken.encoding_for_model("gpt-4.1-mini")
+
+def build_context(texts, budget=CONTEXT_TOKEN_BUDGET):
+    # Keep retrieved chunks in rank order until the token budget is spent
+    kept, used = [], 0
+    for text in texts:
+        used += len(context_encoding.encode(text))
+        if kept and used > budget:
+            break
+        kept.append(text)
+    return "\n\n".join(kept)
+
+def search_contexts(questions, retriever):
+    # Reuse the precomputed question vectors and retrieve them in a single query_batch_points round-trip
+    vectorstore = retriever.vectorstore
+    query_vectors = [q2vec[q] for q in questions]
+    responses = vectorstore.client.query_batch_points(
+        collection_name=vectorstore.collection_name,
+        requests=[
+            QueryRequest(query=vector, limit=retriever.search_kwargs["k"], with_payload=True)
+            for vector in query_vectors
+        ],
+    )
+    return [build_context(p.payload["page_content"] for p in response.points) for response in responses]
+
+# Split docs for vector retrieval; both splits are computed once and shared by every retriever run
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-rag_documents = text_splitter.split_documents(docs)
+rag_documents = to_chunk_table(text_splitter.split_documents(docs))
 
-vectorstore = Qdrant.from_documents(
-    documents=rag_documents,
-    embedding=OpenAIEmbeddings(model="text-embedding-3-small"),
-    location=":memory:",
-    collection_name="AI Bills RAG"
-)
-retriever = vectorstore.as_retriever(search_kwargs={"k": 10})
+# Example: increase chunk overlap for semantic chunking ON
+text_splitter_sc = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=200)
+docs_sc = to_chunk_table(text_splitter_sc.split_documents(docs))
+
+chunk_tables = {False: rag_documents, True: docs_sc}  # keyed by semantic_chunking
+
+# Embed each unique golden question once; every retriever run searches with the same vectors
+unique_qs = list(dict.fromkeys(row.user_input for row in golden_rows))
+q2vec = dict(zip(unique_qs, embed_texts(unique_qs)))
+
+# Exactly one collection per chunking mode, shared across all retriever variants
+vectorstore_sc_off = build_vectorstore(chunk_tables[False], collection_name="AI Bills RAG")
+vectorstore_sc_on = build_vectorstore(chunk_tables[True], collection_name="AI Bills RAG SC")
+retrievers_by_chunking = {
+    False: vectorstore_sc_off.as_retriever(search_kwargs={"k": 10}),
+    True: vectorstore_sc_on.as_retriever(search_kwargs={"k": 10}),
+}
 
 # ==============================
 # RAG Prompt
@@ -124,18 +234,6 @@ def run_rag_retriever(retriever_name, retriever, semantic_chunking=False):
     from langchain_core.output_parsers import StrOutputParser
     start_time = time.time()
     
-    if semantic_chunking:
-        # Example: increase chunk overlap for semantic chunking ON
-        text_splitter_sc = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=200)
-        docs_sc = text_splitter_sc.split_documents(docs)
-        vectorstore_sc = Qdrant.from_documents(
-            documents=docs_sc,
-            embedding=OpenAIEmbeddings(model="text-embedding-3-small"),
-            location=":memory:",
-            collection_name=f"AI Bills RAG SC {retriever_name}"
-        )
-        retriever = vectorstore_sc.as_retriever(search_kwargs={"k": 10})
-    
     # Wrap the LLM in a Runnable
     def prompt_runnable(inputs):
         # inputs should be a dict with keys matching your template, e.g., "context" and "question"
@@ -144,10 +242,13 @@ def run_rag_retriever(retriever_name, retriever, semantic_chunking=False):
     def llm_callable(inputs):
         return llm(inputs["text"])
 
+    questions = [row.user_input for row in golden_rows]
+    contexts = dict(zip(questions, search_contexts(questions, retriever)))
+
     # Compose the RAG chain
     rag_chain = (
         {
-            "context": lambda inputs: retriever.get_relevant_documents(inputs["question"]),
+            "context": lambda inputs: contexts[inputs["question"]],
             "question": lambda inputs: inputs["question"]
         }
         | prompt_runnable
@@ -156,7 +257,7 @@ def run_rag_retriever(retriever_name, retriever, semantic_chunking=False):
     )
     
     responses = []
-    for row in golden_dataset.to_pandas().itertuples():
+    for row in golden_rows:
         responses.append({
             "question": row.user_input,
             "prediction": rag_chain.invoke({"question": row.user_input}),
@@ -176,7 +277,8 @@ results = []
 
 for name in retriever_names:
     for sc in [False, True]:  # semantic chunking off/on
-        responses, latency = run_rag_retriever(name, retriever, semantic_chunking=sc)
+        # Variants wrap the shared collection for this chunking mode instead of rebuilding the index
+        responses, latency = run_rag_retriever(name, retrievers_by_chunking[sc], semantic_chunking=sc)
         results.append({
             "retriever": name,
             "semantic_chunking": sc,
@@ -187,23 +289,40 @@ for name in retriever_names:
 # ==============================
 # Push results to LangSmith
 # ==============================
-from langsmith.evaluation import LangChainStringEvaluator, evaluate
+import asyncio
+from langsmith.evaluation import LangChainStringEvaluator, aevaluate
 
-eval_llm = ChatOpenAI(model="gpt-4.1")
+eval_llm = ChatOpenAI(model="gpt-4.1", **openai_http)
 qa_evaluator = LangChainStringEvaluator("qa", config={"llm": eval_llm})
 
-for run in results:
-    dataset_id = ls_dataset.id
-    evaluate(
-        lambda x: x,  # dummy since we've already invoked
-        data=dataset_id,
-        evaluators=[qa_evaluator],
-        metadata={
-            "retriever": run["retriever"],
-            "semantic_chunking": run["semantic_chunking"],
-            "latency_s": run["latency_s"]
-        }
-    )
+def make_target(run):
+    # Serve the predictions computed above instead of re-invoking the chain
+    predictions = {r["question"]: r["prediction"] for r in run["responses"]}
+
+    async def target(inputs):
+        return {"output": predictions[inputs["question"]]}
+    return target
+
+async def evaluate_runs():
+    # All experiments are judged concurrently instead of one blocking sweep at a time
+    await asyncio.gather(*[
+        aevaluate(
+            make_target(run),
+            data=ls_dataset.id,
+            evaluators=[qa_evaluator],
+            experiment_prefix=f"{run['retriever']}-{run['semantic_chunking']}",
+            metadata={
+                "retriever": run["retriever"],
+                "semantic_chunking": run["semantic_chunking"],
+                "latency_s": run["latency_s"]
+            },
+            max_concurrency=16,
+            client=client
+        )
+        for run in results
+    ])
+
+asyncio.run(evaluate_runs())
 
 # ==============================
 # Link to LangSmith dashboard
@@ -15,10 +15,15 @@ Date: 2024
 
 from mcp.server.fastmcp import FastMCP
 from pydantic_ai import Agent
+from pydantic_ai.models import get_user_agent
 from pydantic_ai.models.google import GoogleModel
 from pydantic_ai.providers.google import GoogleProvider
+from async_lru import alru_cache
 from dotenv import load_dotenv
-from tool.dice_roller import DiceRoller
+from google import genai
+from google.genai.types import HttpOptions
+from tool.dice_roller import SMALL_ROLL_MAX_DICE, DiceBatcher, DiceRoller
+import httpx
 import os
 
 import io
@@ -66,13 +71,85 @@ API_KEY = os.getenv('GOOGLE_API_KEY')
 # Initialize the FastMCP server
 server = FastMCP('Pydantic AI Server')
 
-# Set up Google AI provider and model
-provider = GoogleProvider(api_key=API_KEY)
+# Set up Google AI provider and model. Like pydantic-ai's default client, an
+# explicit httpx transport keeps google-genai on one shared httpx client
+# (otherwise it opens an aiohttp session per request when aiohttp is
+# installed); the transport here also speaks HTTP/2 and keeps up to 50
+# connections alive for reuse.
+genai_client = genai.Client(
+    api_key=API_KEY,
+    http_options=HttpOptions(
+        headers={"User-Agent": get_user_agent()},
+        async_client_args={
+            "transport": httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=50),
+            ),
+        },
+    ),
+)
+provider = GoogleProvider(client=genai_client)
 model = GoogleModel('gemini-1.5-flash', provider=provider)
 
 # Create the main AI agent for tool execution
 server_agent = Agent(model)
 
+# Coalesces concurrent multi-roll and large dice requests into one vectorized draw per notation
+dice_batcher = DiceBatcher()
+
+
+class _Theme(str):
+    """
+    Poem theme that hashes and compares by its normalized form.
+    
+    The string value is the caller's theme with surrounding whitespace
+    stripped, so the prompt keeps its original casing, while cache lookups
+    treat "AI Ethics" and "  ai   ethics " as the same theme.
+    """
+    def __new__(cls, theme: str):
+        self = super().__new__(cls, theme.strip())
+        self.key = " ".join(theme.split()).lower()
+        return self
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _Theme) and self.key == other.key
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+
+@alru_cache(maxsize=1024)
+async def _cached_poem(theme: _Theme) -> str:
+    # alru_cache also shares a pending call between concurrent callers,
+    # so requests for the same theme never hit the model twice at once
+    r = await server_agent.run(f'write a poem about {theme}')
+    return r.output
+
+
+# Shared implementations behind both the MCP tools and the HTTP routes
+
+async def _gen_poem(theme: str) -> str:
+    """Return a (possibly cached) poem; the cache ignores case and whitespace of the theme."""
+    return await _cached_poem(_Theme(theme))
+
+
+async def _roll(notation: str, num_rolls: int = 1, totals_only: bool = False) -> str:
+    """
+    Roll dice and return the formatted result.
+    
+    A single roll of a few dice is cheaper than a trip through the batcher,
+    so it runs inline on DiceRoller's pure-Python roll_dice path; everything
+    else goes through the shared batcher.
+    """
+    if num_rolls == 1 and not totals_only:
+        roller = DiceRoller(notation)
+        if roller.num_dice <= SMALL_ROLL_MAX_DICE:
+            return str(roller)
+    return await dice_batcher.roll(notation, num_rolls, totals_only)
+
 
 @server.tool()
 async def poet(theme: str) -> str:
@@ -89,36 +166,94 @@ async def poet(theme: str) -> str:
         >>> await poet("artificial intelligence")
         "A mind of silicon, a heart of code..."
     """
-    r = await server_agent.run(f'write a poem about {theme}')
-    return r.output
+    return await _gen_poem(theme)
 
 
 @server.tool()
-def roll_dice(notation: str, num_rolls: int = 1) -> str:
+async def roll_dice(notation: str, num_rolls: int = 1, totals_only: bool = False) -> str:
     """
     Roll dice using standard dice notation (e.g., "2d6" for two six-sided dice).
     
     Args:
         notation (str): Dice notation in format "XdY" where X is number of dice and Y is sides
         num_rolls (int, optional): Number of times to roll. Defaults to 1.
+        totals_only (bool, optional): Report only each roll's total, not the
+            individual dice. Defaults to False.
         
     Returns:
         str: Formatted result of the dice rolls
         
     Examples:
-        >>> roll_dice("1d20")
+        >>> await roll_dice("1d20")
         "ROLLS: 15 -> RETURNS: 15"
         
-        >>> roll_dice("2d6", 3)
+        >>> await roll_dice("2d6", 3)
         "Roll 1: ROLLS: 6, 2 -> RETURNS: 8\nRoll 2: ROLLS: 4, 3 -> RETURNS: 7..."
+        
+        >>> await roll_dice("2d6", 3, totals_only=True)
+        "Roll 1: RETURNS: 8\nRoll 2: RETURNS: 7\nRoll 3: RETURNS: 5"
     """
-    roller = DiceRoller(notation, num_rolls)
-    return str(roller)
+    return await _roll(notation, num_rolls, totals_only)
 
 
 # Add HTTP endpoints for the tools
+import orjson
+from pydantic import BaseModel, ConfigDict
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import Response
+
+
+class ORJSONResponse(Response):
+    """JSON response encoded with orjson instead of the stdlib json module."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+class PoetArgs(BaseModel):
+    """Arguments accepted by the poet HTTP endpoint."""
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+    theme: str = "artificial intelligence"
+
+
+class PoetRequest(BaseModel):
+    """Request body for the poet HTTP endpoint."""
+    model_config = ConfigDict(extra="ignore")
+
+    arguments: PoetArgs = PoetArgs()
+
+
+class RollArgs(BaseModel):
+    """Arguments accepted by the roll_dice HTTP endpoint."""
+    model_config = ConfigDict(extra="ignore")
+
+    notation: str = "1d20"
+    num_rolls: int = 1
+    totals_only: bool = False
+
+
+class RollRequest(BaseModel):
+    """Request body for the roll_dice HTTP endpoint."""
+    model_config = ConfigDict(extra="ignore")
+
+    arguments: RollArgs = RollArgs()
+
+
+# The tool list never changes, so it is serialized once at import time
+_TOOLS_JSON = orjson.dumps({
+    "tools": [
+        {
+            "name": "poet",
+            "description": "Poem generator"
+        },
+        {
+            "name": "roll_dice", 
+            "description": "Roll the dice with the given notation"
+        }
+    ]
+})
 
 @server.custom_route("/tools", methods=["GET"])
 async def list_tools(request: Request):
@@ -129,19 +264,9 @@ async def list_tools(request: Request):
         request (Request): Starlette request object
         
     Returns:
-        JSONResponse: List of available tools with names and descriptions
+        Response: Pre-serialized JSON list of available tools with names and descriptions
     """
-    tools = [
-        {
-            "name": "poet",
-            "description": "Poem generator"
-        },
-        {
-            "name": "roll_dice", 
-            "description": "Roll the dice with the given notation"
-        }
-    ]
-    return JSONResponse({"tools": tools})
+    return Response(_TOOLS_JSON, media_type="application/json")
 
 
 @server.custom_route("/tools/poet", methods=["POST"])
@@ -153,19 +278,19 @@ async def call_poet(request: Request):
         request (Request): Starlette request object containing JSON with theme
         
     Returns:
-        JSONResponse: Generated poem or error message
+        ORJSONResponse: Generated poem or error message
         
     Request body format:
         {"arguments": {"theme": "your_theme_here"}}
     """
-    data = await request.json()
-    theme = data.get("arguments", {}).get("theme", "artificial intelligence")
+    body = await request.body()
     
     try:
-        r = await server_agent.run(f'write a poem about {theme}')
-        return JSONResponse({"content": [{"text": r.output}]})
+        theme = PoetRequest.model_validate_json(body or b"{}").arguments.theme
+        output = await _gen_poem(theme)
+        return ORJSONResponse({"content": [{"text": output}]})
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 
 @server.custom_route("/tools/roll_dice", methods=["POST"])
@@ -177,21 +302,19 @@ async def call_roll_dice(request: Request):
         request (Request): Starlette request object containing JSON with dice parameters
         
     Returns:
-        JSONResponse: Dice roll results or error message
+        ORJSONResponse: Dice roll results or error message
         
     Request body format:
-        {"arguments": {"notation": "2d6", "num_rolls": 3}}
+        {"arguments": {"notation": "2d6", "num_rolls": 3, "totals_only": false}}
     """
-    data = await request.json()
-    args = data.get("arguments", {})
-    notation = args.get("notation", "1d20")
-    num_rolls = args.get("num_rolls", 1)
+    body = await request.body()
     
     try:
-        roller = DiceRoller(notation, num_rolls)
-        return JSONResponse({"content": [{"text": str(roller)}]})
+        args = RollRequest.model_validate_json(body or b"{}").arguments
+        text = await _roll(args.notation, args.num_rolls, args.totals_only)
+        return ORJSONResponse({"content": [{"text": text}]})
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 
 if __name__ == '__main__':
@@ -201,7 +324,15 @@ if __name__ == '__main__':
         # Run as HTTP server for web-based access
         import uvicorn
         print("Starting MCP server in HTTP mode on http://localhost:8000")
-        uvicorn.run(server.streamable_http_app(), host="0.0.0.0", port=8000)
+        # uvloop (libuv event loop) and httptools (C HTTP parser) replace the
+        # pure-Python defaults; uvloop is not available on Windows
+        uvicorn.run(
+            server.streamable_http_app(),
+            host="0.0.0.0",
+            port=8000,
+            loop="asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+        )
     else:
         # Run in stdio mode for MCP client communication (default)
         print("Starting MCP server in stdio mode...")
@@ -16,13 +16,231 @@ Features:
 - Multiple roll support
 - Keep/drop highest/lowest dice
 - Formatted output for MCP integration
+- Vectorized rolling with NumPy's random Generator
+- Numba-compiled kernel for very large batches of rolls
+- Coalescing of concurrent same-notation requests into one draw
 
 Author: AI Assistant
 Date: 2024
 """
 
+import asyncio
+import functools
+import heapq
 import random
 import re
+import threading
+from functools import cached_property
+from typing import NamedTuple
+
+import numpy as np
+from numba import njit, prange
+
+# Regex pattern for parsing dice notation, compiled once and shared by all instances
+# Pattern matches: (\d+)d(\d+)(?:k(\d+))?
+# Groups: 1=num_dice, 2=dice_sides, 3=keep_count (optional)
+_DICE_RE = re.compile(r"(\d+)d(\d+)(?:k(\d+))?")
+
+# Largest die accepted; face values are drawn as 64-bit NumPy integers
+MAX_DICE_SIDES = 1_000_000_000
+
+@functools.lru_cache(maxsize=256)
+def _parse_notation(notation: str) -> tuple[int, int, int]:
+    """
+    Parse dice notation into its integer components.
+    
+    Results are memoized, so hot notations such as "1d20" or "2d6" skip the
+    regex entirely after the first request. The cache is bounded so
+    arbitrary user-supplied strings cannot grow it without limit.
+    
+    Args:
+        notation (str): Dice notation in format "XdY" or "XdYkZ"
+        
+    Returns:
+        tuple[int, int, int]: (num_dice, dice_sides, keep)
+        
+    Raises:
+        ValueError: If the dice notation is invalid or a die has more than
+            MAX_DICE_SIDES sides
+    """
+    match = _DICE_RE.match(notation)
+    # A die needs at least one side
+    if not match or int(match.group(2)) < 1:
+        raise ValueError(f"Invalid dice notation: {notation}. Use format 'XdY' or 'XdYkZ'")
+    if int(match.group(2)) > MAX_DICE_SIDES:
+        raise ValueError(f"Invalid dice notation: {notation}. Dice can have at most {MAX_DICE_SIDES} sides")
+
+    num_dice = int(match.group(1))      # Number of dice to roll
+    dice_sides = int(match.group(2))    # Number of sides on each die
+    keep = int(match.group(3)) if match.group(3) else num_dice  # How many to keep
+    return num_dice, dice_sides, keep
+
+
+# Dice with at most this many sides format their values through a cached string table
+FACE_TABLE_MAX_SIDES = 1000
+
+
+@functools.lru_cache(maxsize=64)
+def _face_strings(sides: int) -> tuple[str, ...]:
+    """
+    Return the string form of every face value 0..sides, shared by all rollers.
+    
+    Args:
+        sides (int): Number of sides on the die
+        
+    Returns:
+        tuple[str, ...]: Tuple where index i holds str(i)
+    """
+    return tuple(str(i) for i in range(sides + 1))
+
+
+# Single rolls of at most this many dice skip NumPy, whose fixed per-call overhead
+# costs more than a single pure-Python choices() call
+SMALL_ROLL_MAX_DICE = 32
+
+# Shared pure-Python RNG; choices() draws all k dice in one C-level loop
+_choices = random.Random().choices
+
+# Shared NumPy Generator; creating one per roller costs more than a small roll itself
+_rng = np.random.default_rng()
+
+# Batches with at least this many dice in total go through the compiled kernel
+JIT_THRESHOLD = 100_000
+
+# Totals-only rolls sample from a precomputed sum distribution when it has at
+# most this many outcomes
+PMF_MAX_OUTCOMES = 10_000
+
+# Serializes calls into the parallel kernel; numba's fallback workqueue threading
+# layer aborts the process if two threads launch a parallel region at once
+_KERNEL_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=64)
+def _sum_pmf(num_dice: int, sides: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the distribution of the sum of num_dice fair dice, shared by all rollers.
+    
+    The PMF is built once per (num_dice, sides) by convolving the uniform
+    single-die PMF with itself num_dice times.
+    
+    Args:
+        num_dice (int): Number of dice summed
+        sides (int): Number of sides on each die
+        
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (totals, probs) where probs[i] is the
+            probability of rolling exactly totals[i]
+    """
+    die = np.full(sides, 1.0 / sides)
+    probs = np.ones(1)
+    for _ in range(num_dice):
+        probs = np.convolve(probs, die)
+    totals = np.arange(num_dice, num_dice * sides + 1, dtype=np.int64)
+    return totals, probs / probs.sum()
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def _roll_batch(num_rolls: int, num_dice: int, sides: int, keep: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Roll, sort and total a whole batch of rolls in one compiled pass.
+    
+    Rows are processed in parallel; each row is drawn, sorted and written
+    highest first while its kept dice are summed, so no intermediate
+    arrays are materialized for the batch.
+    
+    Args:
+        num_rolls (int): Number of rolls (rows)
+        num_dice (int): Number of dice per roll
+        sides (int): Number of sides on each die
+        keep (int): Number of highest dice summed per roll
+        
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (num_rolls, num_dice) rolls, highest
+            first per row, and the (num_rolls,) totals of the kept dice
+    """
+    rolls = np.empty((num_rolls, num_dice), dtype=np.int64)
+    totals = np.empty(num_rolls, dtype=np.int64)
+    for r in prange(num_rolls):
+        row = np.sort(np.random.randint(1, sides + 1, num_dice))
+        total = 0
+        for j in range(num_dice):
+            value = row[num_dice - 1 - j]
+            rolls[r, j] = value
+            if j < keep:
+                total += value
+        totals[r] = total
+    return rolls, totals
+
+
+def format_results(rolls: np.ndarray, totals: np.ndarray, dice_sides: int) -> str:
+    """
+    Format roll rows and their totals as DiceRoller output text.
+    
+    A single row uses the simple "ROLLS: X, Y -> RETURNS: Z" format; any
+    other number of rows is numbered "Roll 1: ..." line by line.
+    
+    Args:
+        rolls (np.ndarray): (n, num_dice) dice values, highest first per row
+        totals (np.ndarray): (n,) kept-dice totals per row
+        dice_sides (int): Number of sides on each die
+        
+    Returns:
+        str: Formatted roll results
+    """
+    # Look face values up in a prebuilt table instead of calling str() per die
+    if dice_sides <= FACE_TABLE_MAX_SIDES:
+        to_str = _face_strings(dice_sides).__getitem__
+    else:
+        to_str = str
+    
+    if len(rolls) == 1:
+        # Single roll - simple format
+        row, total = rolls[0].tolist(), totals.tolist()[0]
+        return "".join(("ROLLS: ", ", ".join(map(to_str, row)), " -> RETURNS: ", str(total)))
+    
+    # Multiple rolls - detailed format with roll numbers, read straight from the arrays
+    parts = []
+    
+    # Collect every fragment and join once at the end
+    for i, (row, total) in enumerate(zip(rolls.tolist(), totals.tolist()), 1):
+        parts.extend(("Roll ", str(i), ": ROLLS: ", ", ".join(map(to_str, row)), " -> RETURNS: ", str(total), "\n"))
+    
+    # Drop the trailing newline
+    return "".join(parts[:-1])
+
+
+def format_totals(totals: np.ndarray) -> str:
+    """
+    Format per-roll totals without the individual dice.
+    
+    A single total uses "RETURNS: Z"; any other number of totals is
+    numbered "Roll 1: RETURNS: Z" line by line.
+    
+    Args:
+        totals (np.ndarray): (n,) kept-dice totals per roll
+        
+    Returns:
+        str: Formatted totals
+    """
+    values = totals.tolist()
+    if len(values) == 1:
+        return "RETURNS: " + str(values[0])
+    return "\n".join(["".join(("Roll ", str(i), ": RETURNS: ", str(total))) for i, total in enumerate(values, 1)])
+
+
+class RollResults(NamedTuple):
+    """
+    Outcome of a batch of rolls, stored as one array per field.
+    
+    Attributes:
+        rolls (np.ndarray): (num_rolls, num_dice) dice values, highest first per row
+        kept (np.ndarray): (num_rolls, keep) kept dice values per row
+        totals (np.ndarray): (num_rolls,) sum of kept dice values per row
+    """
+    rolls: np.ndarray
+    kept: np.ndarray
+    totals: np.ndarray
 
 
 class DiceRoller:
@@ -35,7 +253,10 @@ class DiceRoller:
     Attributes:
         notation (str): Dice notation string (e.g., "2d6k1")
         num_rolls (int): Number of times to roll the dice
-        dice_pattern (re.Pattern): Compiled regex pattern for parsing notation
+        num_dice (int): Number of dice rolled per roll, parsed from notation
+        dice_sides (int): Number of sides on each die, parsed from notation
+        keep (int): Number of highest dice kept per roll, parsed from notation
+        results (RollResults): Cached (rolls, kept, totals) outcome, rolled on first access
     """
     
     def __init__(self, notation: str, num_rolls: int = 1):
@@ -52,91 +273,154 @@ class DiceRoller:
         Examples:
             >>> roller = DiceRoller("2d6", 3)
             >>> roller = DiceRoller("4d6k3")  # Roll 4d6, keep highest 3
+
+        Raises:
+            ValueError: If the dice notation is invalid
         """
         self.notation = notation
         self.num_rolls = num_rolls
-        
-        # Compile regex pattern for parsing dice notation
-        # Pattern matches: (\d+)d(\d+)(k(\d+))?
-        # Groups: 1=num_dice, 2=dice_sides, 4=keep_count (optional)
-        self.dice_pattern = re.compile(r"(\d+)d(\d+)(k(\d+))?")
+
+        # Parse the notation once (memoized across instances) so every roll reuses the same integers
+        self.num_dice, self.dice_sides, self.keep = _parse_notation(self.notation)
+
+        # Face values for the pure-Python path, built once instead of per roll
+        self._faces = range(1, self.dice_sides + 1)
+
+        # Shared NumPy Generator; int16 holds any die up to 32766 sides
+        self._rng = _rng
+        self._dtype = np.int16 if self.dice_sides < np.iinfo(np.int16).max else np.int64
 
     def roll_dice(self) -> tuple[list[int], list[int]]:
         """
         Roll dice according to the notation and return all rolls and kept rolls.
         
-        This method parses the dice notation, generates random rolls,
-        sorts them, and applies keep/drop mechanics.
+        This method draws all dice in a single vectorized NumPy call and
+        selects the highest dice to keep without sorting the discards.
+        Rolls of at most SMALL_ROLL_MAX_DICE dice use a single pure-Python
+        random.choices call instead.
+        
+        When every die is kept there is nothing to select, so no heap,
+        partition or sort runs and kept_rolls is a copy of all_rolls.
         
         Returns:
-            tuple[list[int], list[int]]: Tuple of (all_rolls, kept_rolls)
-            
-        Raises:
-            ValueError: If the dice notation is invalid
+            tuple[list[int], list[int]]: Tuple of (all_rolls, kept_rolls).
+                all_rolls are in roll order; kept_rolls are highest first,
+                or in roll order when every die is kept.
             
         Example:
             >>> roller = DiceRoller("4d6k3")
             >>> all_rolls, kept_rolls = roller.roll_dice()
             >>> print(f"All: {all_rolls}, Kept: {kept_rolls}")
-            All: [6, 4, 2, 1], Kept: [6, 4, 2]
+            All: [2, 6, 1, 4], Kept: [6, 4, 2]
         """
-        # Parse the dice notation using regex
-        match = self.dice_pattern.match(self.notation)
-        if not match:
-            raise ValueError(f"Invalid dice notation: {self.notation}. Use format 'XdY' or 'XdYkZ'")
-
-        # Extract components from the regex match
-        num_dice = int(match.group(1))      # Number of dice to roll
-        dice_sides = int(match.group(2))    # Number of sides on each die
-        keep = int(match.group(4)) if match.group(4) else num_dice  # How many to keep
-
-        # Generate random rolls for each die
-        rolls = [random.randint(1, dice_sides) for _ in range(num_dice)]
+        if self.num_dice <= SMALL_ROLL_MAX_DICE:
+            rolls = _choices(self._faces, k=self.num_dice)
+            if self.keep >= self.num_dice:
+                return rolls, rolls[:]
+            # Heap selection of the highest dice; the discards are never sorted
+            return rolls, heapq.nlargest(self.keep, rolls)
         
-        # Sort rolls in descending order (highest first)
-        rolls.sort(reverse=True)
+        # Generate all dice in one C-level RNG call
+        rolls = self._rng.integers(1, self.dice_sides + 1, size=self.num_dice, dtype=self._dtype)
         
-        # Keep only the specified number of highest rolls
-        kept_rolls = rolls[:keep]
+        # Keep only the specified number of highest rolls: O(n) partition, then sort just the kept ones
+        drop = self.num_dice - self.keep
+        if drop <= 0:
+            all_rolls = rolls.tolist()
+            return all_rolls, all_rolls[:]
+        if drop >= self.num_dice:
+            kept_rolls = rolls[:0]
+        else:
+            kept_rolls = rolls[np.argpartition(rolls, drop)[drop:]]
+        kept_rolls[::-1].sort()
 
-        return rolls, kept_rolls
+        return rolls.tolist(), kept_rolls.tolist()
 
-    def roll_multiple(self) -> list[dict]:
+    def roll_multiple(self) -> RollResults:
         """
         Roll the dice multiple times according to num_rolls.
         
-        This method performs multiple rolls and returns detailed results
-        for each roll including individual dice values and totals.
+        All rolls are drawn as one (num_rolls, num_dice) matrix, sorted
+        row-wise and reduced in a single pass instead of looping over
+        roll_dice once per roll. Batches of JIT_THRESHOLD dice or more are
+        dispatched to the Numba-compiled _roll_batch kernel.
         
         Returns:
-            list[dict]: List of dictionaries containing roll results:
-                - rolls: List of all dice values
-                - kept: List of kept dice values
-                - total: Sum of kept dice values
+            RollResults: (rolls, kept, totals) arrays with one row per roll
                 
         Example:
             >>> roller = DiceRoller("2d6", 3)
             >>> results = roller.roll_multiple()
-            >>> for result in results:
-            ...     print(f"Rolls: {result['rolls']}, Total: {result['total']}")
+            >>> for row, total in zip(results.rolls, results.totals):
+            ...     print(f"Rolls: {row.tolist()}, Total: {total}")
         """
-        results = []
-        for _ in range(self.num_rolls):
-            # Roll the dice for this iteration
-            rolls, kept_rolls = self.roll_dice()
+        if self.num_rolls * self.num_dice >= JIT_THRESHOLD:
+            with _KERNEL_LOCK:
+                rolls, totals = _roll_batch(self.num_rolls, self.num_dice, self.dice_sides, self.keep)
+            return RollResults(rolls, rolls[:, :self.keep], totals)
+        
+        # Draw every die of every roll in one call
+        rolls = self._rng.integers(1, self.dice_sides + 1, size=(self.num_rolls, self.num_dice), dtype=self._dtype)
+        
+        # Sort each row ascending in place, then view it highest first
+        rolls.sort(axis=1)
+        rolls = rolls[:, ::-1]
+        
+        # Keep the highest dice of each row and total them
+        kept = rolls[:, :self.keep]
+        totals = kept.sum(axis=1, dtype=np.int64)
+        return RollResults(rolls, kept, totals)
+
+    def roll_totals(self) -> np.ndarray:
+        """
+        Roll the dice num_rolls times and return only the per-roll totals.
+        
+        When every die is kept, totals are drawn directly from the cached
+        sum distribution (_sum_pmf) with one sample per roll instead of
+        one per die. Keep-highest notations, and dice whose sum has more
+        than PMF_MAX_OUTCOMES outcomes, fall back to roll_multiple.
+        
+        Returns:
+            np.ndarray: (num_rolls,) sum of kept dice values per roll
             
-            # Store the results
-            results.append({
-                "rolls": rolls,           # All dice values
-                "kept": kept_rolls,       # Kept dice values
-                "total": sum(kept_rolls)  # Sum of kept dice
-            })
-        return results
+        Example:
+            >>> DiceRoller("2d6", 100_000).roll_totals().mean()
+            7.0012
+        """
+        if self.keep >= self.num_dice and 0 < self.num_dice * (self.dice_sides - 1) < PMF_MAX_OUTCOMES:
+            totals, probs = _sum_pmf(self.num_dice, self.dice_sides)
+            return self._rng.choice(totals, size=self.num_rolls, p=probs)
+        return self.roll_multiple().totals
+
+    @cached_property
+    def results(self) -> RollResults:
+        """
+        Roll the dice on first access and cache the outcome for this roller.
+        
+        Formatting reads this cached outcome, so str(roller) is idempotent
+        and repeated stringification (logging, repr, tests) never re-rolls.
+        
+        Returns:
+            RollResults: (rolls, kept, totals) in the same layout as
+                roll_multiple, with one row per roll
+        """
+        if self.num_rolls == 1:
+            # A single roll stays on the faster roll_dice path; sort it here for display
+            rolls, kept_rolls = self.roll_dice()
+            rolls.sort(reverse=True)
+            if self.keep >= self.num_dice:
+                # Every die was kept unsorted; reuse the display order
+                kept_rolls = rolls
+            return RollResults(np.array([rolls]), np.array([kept_rolls]), np.array([sum(kept_rolls)]))
+        return self.roll_multiple()
 
     def __str__(self) -> str:
         """
         Return a formatted string representation of the dice roll results.
         
+        The dice are rolled once per roller (see results); calling str()
+        again formats the same outcome.
+        
         The format depends on the number of rolls:
         - Single roll: "ROLLS: X, Y -> RETURNS: Z"
         - Multiple rolls: "Roll 1: ROLLS: X, Y -> RETURNS: Z\nRoll 2: ..."
@@ -155,20 +439,124 @@ class DiceRoller:
             Roll 2: ROLLS: 8 -> RETURNS: 8
             Roll 3: ROLLS: 19 -> RETURNS: 19
         """
-        if self.num_rolls == 1:
-            # Single roll - simple format
-            rolls, kept_rolls = self.roll_dice()
-            return f"ROLLS: {', '.join(map(str, rolls))} -> RETURNS: {sum(kept_rolls)}"
-        else:
-            # Multiple rolls - detailed format with roll numbers
-            results = self.roll_multiple()
-            result_strs = []
+        results = self.results
+        return format_results(results.rolls, results.totals, self.dice_sides)
+
+
+class DiceBatcher:
+    """
+    Coalesce concurrent roll requests into one vectorized draw per notation.
+    
+    Requests that arrive within the same short window and share a notation
+    are served from a single (total_rolls, num_dice) draw, whose rows are
+    then sliced back to each caller. This amortizes the fixed per-call
+    overhead of rolling across many small concurrent requests. Totals-only
+    requests are batched separately and sampled through roll_totals.
+    
+    Attributes:
+        window (float): Coalescing window in seconds
+    """
+    
+    def __init__(self, window: float = 0.001):
+        """
+        Initialize the batcher.
+        
+        Args:
+            window (float, optional): Seconds to wait for more requests before
+                flushing a batch. Defaults to 1 ms.
+        """
+        # Compile (or load from cache) the large-batch kernel and start its
+        # thread pool now, on the main thread, rather than stalling the first
+        # batch that crosses JIT_THRESHOLD
+        with _KERNEL_LOCK:
+            _roll_batch(1, 1, 2, 1)
+        
+        self.window = window
+        self._pending: dict[tuple[str, bool], list[tuple[asyncio.Future, int]]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def roll(self, notation: str, num_rolls: int = 1, totals_only: bool = False) -> str:
+        """
+        Roll dice as part of the current batch and return the formatted result.
+        
+        Args:
+            notation (str): Dice notation in format "XdY" or "XdYkZ"
+            num_rolls (int, optional): Number of times to roll. Defaults to 1.
+            totals_only (bool, optional): Return only the per-roll totals
+                (see format_totals), which lets notations without a keep
+                count skip simulating each die. Defaults to False.
             
-            for i, result in enumerate(results, 1):
-                roll_str = f"Roll {i}: ROLLS: {', '.join(map(str, result['rolls']))} -> RETURNS: {result['total']}"
-                result_strs.append(roll_str)
+        Returns:
+            str: Formatted result, identical in format to str(DiceRoller(...))
+                unless totals_only is set
             
-            return "\n".join(result_strs)
+        Raises:
+            ValueError: If the dice notation is invalid or num_rolls is negative
+        """
+        # Reject bad input before it can fail or misalign a whole batch
+        _parse_notation(notation)
+        if num_rolls < 0:
+            raise ValueError(f"num_rolls must be non-negative, got {num_rolls}")
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault((notation, totals_only), []).append((future, num_rolls))
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        """Background loop: sleep until woken, wait one window, flush everything pending."""
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.window)
+            self._wakeup.clear()
+            pending, self._pending = self._pending, {}
+            await asyncio.gather(*(self._flush(*key, waiters) for key, waiters in pending.items()))
+
+    async def _flush(self, notation: str, totals_only: bool, waiters: list[tuple[asyncio.Future, int]]) -> None:
+        """
+        Draw every waiter's rolls at once and hand each its own slice.
+        
+        Batches large enough for the compiled kernel are drawn and formatted
+        in a worker thread, so neither the kernel's one-off compile nor a
+        long draw blocks the event loop. Any failure is set on every
+        waiter that is still pending.
+        """
+        try:
+            roller = DiceRoller(notation, sum(num_rolls for _, num_rolls in waiters))
+            if roller.num_rolls * roller.num_dice >= JIT_THRESHOLD:
+                texts = await asyncio.to_thread(self._draw, roller, totals_only, waiters)
+            else:
+                texts = self._draw(roller, totals_only, waiters)
+        except Exception as e:
+            for future, _ in waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (future, _), text in zip(waiters, texts):
+            if not future.done():
+                future.set_result(text)
+
+    @staticmethod
+    def _draw(roller: DiceRoller, totals_only: bool, waiters: list[tuple[asyncio.Future, int]]) -> list[str]:
+        """Roll the whole batch and format each waiter's slice of rows."""
+        if totals_only:
+            totals = roller.roll_totals()
+        else:
+            results = roller.roll_multiple()
+        texts = []
+        start = 0
+        for _, num_rolls in waiters:
+            end = start + num_rolls
+            if totals_only:
+                texts.append(format_totals(totals[start:end]))
+            else:
+                texts.append(format_results(results.rolls[start:end], results.totals[start:end], roller.dice_sides))
+            start = end
+        return texts
 
 
 if __name__ == "__main__":